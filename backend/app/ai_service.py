@@ -1,122 +1,100 @@
+import asyncio
 import os
-import json
-import base64
+import re
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
 from typing import List, Optional
-from PIL import Image
 import io
-import requests
-import ollama
 
-class Phi4Service:
-    def __init__(self):
-        self.model_name = "phi4-mini:latest"  # Updated to match Ollama format
-        self.client = ollama.Client()
-        self.is_model_available = False
-        
-    def check_model_availability(self):
-        """Check if Phi-4 Mini model is available in Ollama"""
-        try:
-            models_response = self.client.list()
-            print(f"Debug: Ollama response type: {type(models_response)}")  # Debug print
-            
-            if hasattr(models_response, 'models') or 'models' in models_response:
-                # Handle both object and dict responses
-                models = models_response.models if hasattr(models_response, 'models') else models_response['models']
-                
-                available_models = []
-                for model in models:
-                    # Handle both object and dict model representations
-                    if hasattr(model, 'model'):
-                        model_name = model.model
-                    elif isinstance(model, dict) and 'name' in model:
-                        model_name = model['name']
-                    elif isinstance(model, dict) and 'model' in model:
-                        model_name = model['model']
-                    else:
-                        model_name = str(model)
-                    available_models.append(model_name)
-                
-                print(f"Debug: Available models: {available_models}")  # Debug print
-                
-                # Check for phi4-mini
-                self.is_model_available = any(
-                    'phi4-mini' in model.lower() for model in available_models
-                )
-                
-                if self.is_model_available:
-                    # Find the exact model name
-                    for model in available_models:
-                        if 'phi4-mini' in model.lower():
-                            self.model_name = model
-                            print(f"Debug: Using model: {self.model_name}")  # Debug print
-                            break
-                    
-                return self.is_model_available
-            else:
-                print("Debug: No 'models' in response")
-                return False
-        except Exception as e:
-            print(f"Error checking Ollama models: {e}")
-            print(f"Error type: {type(e)}")
-            import traceback
-            traceback.print_exc()
-            return False
-    
-    def preprocess_image(self, image_path: str) -> str:
-        """Convert image to base64 for Ollama"""
-        try:
-            image = Image.open(image_path)
-            # Resize if too large
-            if image.size[0] > 1024 or image.size[1] > 1024:
-                image.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='JPEG')
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            return img_base64
-        except Exception as e:
-            print(f"Error preprocessing image: {e}")
-            return None
-    
-    def generate_repair_plan(self, image_path: str, description: str) -> dict:
-        """Generate repair plan using Phi-4 Mini via Ollama"""
-        print(f"Generating repair plan for: {description}")
-        
-        if not self.check_model_availability():
-            raise Exception("Phi-4 Mini model is not available. Please ensure Ollama is running and phi4-mini is installed.")
-        
-        try:
-            # Create a detailed prompt for Phi-4
-            prompt = f"""
-You are an expert home repair assistant. Create a detailed repair plan for this issue.
+from pydantic import ValidationError
+
+from app.schemas import RepairPlan
+
+logger = logging.getLogger(__name__)
+
+# Preferred Phi-4 Mini tag. The default is the 4-bit Q4_K_M build (what phi4-mini:latest
+# points to); GPU hosts with >= 8GB VRAM can set PHI4_MODEL=phi4-mini:3.8b-q8_0
+PHI4_MODEL = os.getenv("PHI4_MODEL", "phi4-mini:3.8b-q4_K_M")
+
+# Ollama server address (the ollama package default, http://localhost:11434, when unset)
+OLLAMA_HOST = os.getenv("OLLAMA_HOST")
+
+# Per-request timeout in seconds for Ollama calls; unset means no limit, since CPU-only
+# hosts can take minutes to generate a full repair plan
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT")) if os.getenv("OLLAMA_TIMEOUT") else None
+
+# Match the client connection pool to the number of requests Ollama serves in parallel
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+
+# Keep the model resident between requests so idle periods don't cost a reload from disk
+KEEP_ALIVE = "30m"
 
-Issue: "{description}"
+# Options Ollama applies when it loads the model. A request with different values makes it
+# reload the runner, so every call (warm-up, repair plans, chat) must pass the same ones.
+LOAD_OPTIONS = {
+    "num_ctx": 1536,  # ~550-token repair prompt plus the plan, or a chat turn with its repair context
+}
+
+# Ollama's default thread count is conservative; CPU-only hosts can set this to their core count
+if os.getenv("PHI4_NUM_THREAD"):
+    LOAD_OPTIONS["num_thread"] = int(os.getenv("PHI4_NUM_THREAD"))
+
+# Generation settings for repair plans and chat
+REPAIR_PLAN_OPTIONS = {
+    **LOAD_OPTIONS,
+    "temperature": 0.0,  # Greedy decoding: deterministic plans and no sampling overhead
+    "num_predict": 600,  # Repair plan JSON is typically well under 600 tokens
+    # Removed stop tokens that were cutting off markdown code blocks
+}
+
+# Greedy decoding would return the same plan byte for byte, so a forced reanalysis samples
+REANALYZE_OPTIONS = {
+    **REPAIR_PLAN_OPTIONS,
+    "temperature": 0.3,
+    "top_p": 0.9,
+}
+
+CHAT_OPTIONS = {
+    **LOAD_OPTIONS,
+    "temperature": 0.7,
+    "num_predict": 200,  # Concise responses
+    "top_p": 0.9,
+}
+
+# Prompt templates are built once at import; only the user-supplied parts are
+# interpolated per request. Static instructions come first and the per-request
+# fields last, so consecutive prompts share a byte-identical prefix that Ollama
+# can serve from its KV cache instead of re-running prefill.
+_REPAIR_PROMPT_PREFIX = """You are an expert home repair assistant. Create a detailed repair plan for the issue given at the end.
 
 You must respond with ONLY valid JSON in exactly this format:
 
-{{
+{
     "diagnosis": "Explain what's wrong and why",
     "steps": [
-        {{
+        {
             "step": 1,
             "instruction": "First action to take",
             "tools_needed": ["tool1", "tool2"],
             "estimated_time": "X minutes"
-        }},
-        {{
+        },
+        {
             "step": 2,
             "instruction": "Second action to take", 
             "tools_needed": ["tool3"],
             "estimated_time": "X minutes"
-        }}
+        }
     ],
     "is_diy": true,
     "estimated_time": "Total time",
     "estimated_cost": "$X-Y",
     "safety_warnings": ["Only include safety warnings that are RELEVANT to this specific repair type - e.g., electrical safety for electrical work, water safety for plumbing, structural safety for wall work. Do NOT include generic electrical warnings for non-electrical repairs"],
     "recommended_provider": "Use ONLY one of these values: 'general', 'plumbing', 'electrical', 'appliances', or null for DIY repairs"
-}}
+}
 
 CRITICAL: Safety warnings must be contextually appropriate. For example:
 - Curtain/window repairs: Use sturdy ladder, check wall anchors, wear safety glasses
@@ -132,205 +110,545 @@ CRITICAL: For recommended_provider, use ONLY these exact values:
 - null for simple DIY repairs
 
 Important: Respond with ONLY the JSON object, no other text or formatting.
+
+Issue: \""""
+
+_REPAIR_PROMPT_SUFFIX = """\"
+"""
+
+_CHAT_PROMPT_PREFIX = """You are HouseHelp.AI, an expert home repair assistant. Answer the user's question based on the repair context provided.
+
+Provide a helpful, specific answer about the repair process. Include:
+- Specific guidance related to their question
+- Safety considerations if relevant
+- Tool recommendations if applicable
+- Step-by-step advice when appropriate
+
+Keep your response informative but concise (2-4 sentences).
+
+Repair Context: """
+
+_NO_CHAT_CONTEXT = "No specific repair context provided."
+
+_CHAT_PROMPT_QUESTION = """
+
+User Question: """
+
+_CHAT_PROMPT_SUFFIX = """
 """
 
-            print("Sending request to Phi-4...")
-            response = self.client.generate(
+# Follow-up turns reuse the session's context tokens, so only the new question is sent
+_CHAT_PROMPT_FOLLOW_UP = _CHAT_PROMPT_QUESTION.lstrip()
+
+_MAX_CHAT_SESSIONS = 256
+# A session's context tokens grow every turn. Past this size the next question and reply would
+# overflow num_ctx, and Ollama would truncate the oldest tokens: the instructions and repair
+# context. Such sessions start over from the full prompt instead.
+_MAX_SESSION_CONTEXT_TOKENS = CHAT_OPTIONS["num_ctx"] - CHAT_OPTIONS["num_predict"] - 128
+_MAX_CACHED_CHAT_RESPONSES = 256
+
+# Keyword vocabulary for the rule-based fallback plan, in precedence order. All categories
+# are compiled into one alternation so a description is scanned once however many keywords
+# there are (substring match, as before).
+_FALLBACK_KEYWORDS = {
+    "electrical": ("electrical", "wire", "outlet", "switch", "light", "power"),
+    "plumbing": ("water", "pipe", "leak", "faucet", "drain", "toilet"),
+}
+_FALLBACK_KEYWORD_RE = re.compile(
+    "|".join(
+        f"(?P<{category}>{'|'.join(map(re.escape, keywords))})"
+        for category, keywords in _FALLBACK_KEYWORDS.items()
+    ),
+    re.IGNORECASE
+)
+
+# Static parts of the fallback repair plans; only the diagnosis varies per call.
+# Read-only views and tuples keep callers from mutating the shared templates.
+_ELECTRICAL_PLAN = MappingProxyType({
+    "steps": (
+        {
+            "step": 1,
+            "instruction": "Turn off power at the circuit breaker",
+            "tools_needed": ("circuit breaker access",),
+            "estimated_time": "2 minutes"
+        },
+        {
+            "step": 2,
+            "instruction": "Contact a licensed electrician for safety",
+            "tools_needed": ("phone",),
+            "estimated_time": "5 minutes"
+        }
+    ),
+    "is_diy": False,
+    "estimated_time": "Professional consultation required",
+    "estimated_cost": "$100-400",
+    "safety_warnings": ("Never work on live electrical circuits", "Always turn off power at breaker", "Use proper electrical tools"),
+    "recommended_provider": "electrical"
+})
+
+_PLUMBING_PLAN = MappingProxyType({
+    "steps": (
+        {
+            "step": 1,
+            "instruction": "Turn off water supply to the affected area",
+            "tools_needed": ("water shut-off valve access",),
+            "estimated_time": "2 minutes"
+        },
+        {
+            "step": 2,
+            "instruction": "Assess the extent of the problem",
+            "tools_needed": ("flashlight", "basic tools"),
+            "estimated_time": "10 minutes"
+        },
+        {
+            "step": 3,
+            "instruction": "For complex issues, contact a plumber",
+            "tools_needed": ("phone",),
+            "estimated_time": "5 minutes"
+        }
+    ),
+    "is_diy": False,
+    "estimated_time": "30-60 minutes assessment",
+    "estimated_cost": "$50-300",
+    "safety_warnings": ("Turn off water to prevent flooding", "Be careful with old pipes"),
+    "recommended_provider": "plumbing"
+})
+
+_GENERAL_PLAN = MappingProxyType({
+    "steps": (
+        {
+            "step": 1,
+            "instruction": "Assess the damage and gather necessary tools",
+            "tools_needed": ("basic toolkit", "safety equipment"),
+            "estimated_time": "10 minutes"
+        },
+        {
+            "step": 2,
+            "instruction": "Clean the area and remove any debris",
+            "tools_needed": ("cleaning supplies", "gloves"),
+            "estimated_time": "15 minutes"
+        },
+        {
+            "step": 3,
+            "instruction": "Follow manufacturer guidelines or consult professional if complex",
+            "tools_needed": ("manual", "appropriate tools"),
+            "estimated_time": "30 minutes"
+        }
+    ),
+    "is_diy": True,
+    "estimated_time": "45 minutes to 1 hour",
+    "estimated_cost": "$20-100",
+    "safety_warnings": ("Wear protective equipment", "Ensure area is safe to work"),
+    "recommended_provider": "general"
+})
+
+_FALLBACK_PLANS = {
+    "electrical": ("Electrical", _ELECTRICAL_PLAN),
+    "plumbing": ("Plumbing", _PLUMBING_PLAN),
+    "general": ("General", _GENERAL_PLAN),
+}
+
+@functools.lru_cache(maxsize=1024)
+def _classify_description(normalized: str) -> str:
+    """Map a normalized issue description to its fallback plan category"""
+    found = {match.lastgroup for match in _FALLBACK_KEYWORD_RE.finditer(normalized)}
+    for category in _FALLBACK_KEYWORDS:
+        if category in found:
+            return category
+    return "general"
+
+class _LRUCache:
+    """Small thread-safe LRU mapping for per-process chat state"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+# Per-thread scratch buffer for JPEG encoding, reused across preprocess_image calls
+_scratch = threading.local()
+
+def _get_scratch_buffer() -> io.BytesIO:
+    """Return this thread's scratch BytesIO, emptied and ready for writing"""
+    buffer = getattr(_scratch, "buffer", None)
+    if buffer is None:
+        buffer = _scratch.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+# Descriptions this short with a strong keyword match are answered by the rule-based plan
+_SHORT_CIRCUIT_MAX_WORDS = 4
+
+# Skipping the LLM needs more than the fallback's substring match: keywords must be whole
+# words ("skylight" and "switchblade" are not electrical), and words that are as often about
+# something else ("light bulb", "power washer", "water stain") never qualify.
+_SHORT_CIRCUIT_KEYWORDS = {
+    category: tuple(k for k in keywords if k not in {"light", "power", "water"})
+    for category, keywords in _FALLBACK_KEYWORDS.items()
+}
+_SHORT_CIRCUIT_KEYWORD_RE = re.compile(
+    "|".join(
+        f"(?P<{category}>\\b(?:{'|'.join(map(re.escape, keywords))})\\b)"
+        for category, keywords in _SHORT_CIRCUIT_KEYWORDS.items()
+    ),
+    re.IGNORECASE
+)
+
+def _short_circuit_category(description: str) -> Optional[str]:
+    """Fallback category for a short description whose whole-word keywords all fall in one category, else None"""
+    if len(description.split()) > _SHORT_CIRCUIT_MAX_WORDS:
+        return None
+    found = {match.lastgroup for match in _SHORT_CIRCUIT_KEYWORD_RE.finditer(description)}
+    return found.pop() if len(found) == 1 else None
+
+class Phi4Service:
+    def __init__(self):
+        self.model_name = PHI4_MODEL
+        self.is_model_available = False
+        # Availability is cached so steady-state requests skip the /api/tags round-trip
+        self._avail_checked_at: float = 0.0
+        self._avail_ttl = 60.0
+        self._avail_lock = threading.Lock()
+        # Per-session Ollama context tokens for multi-turn chat
+        self._session_contexts = _LRUCache(_MAX_CHAT_SESSIONS)
+        # Answers (with their context tokens) to conversation-opening questions, keyed by repair context + normalized question
+        self._chat_responses = _LRUCache(_MAX_CACHED_CHAT_RESPONSES)
+        # Short-circuit hit rate, logged so the word threshold can be tuned against real traffic
+        self._plan_requests = 0
+        self._short_circuit_hits = 0
+        
+    @staticmethod
+    def _client_options() -> dict:
+        """Host, timeout and connection pool limits shared by the sync and async Ollama clients"""
+        import httpx
+        # One warm keep-alive connection per Ollama slot, with headroom for bursts
+        # (e.g. long-lived streaming chats) that queue on the server side
+        limits = httpx.Limits(
+            max_connections=OLLAMA_NUM_PARALLEL * 4,
+            max_keepalive_connections=OLLAMA_NUM_PARALLEL
+        )
+        return {"host": OLLAMA_HOST, "timeout": OLLAMA_TIMEOUT, "limits": limits}
+    
+    @functools.cached_property
+    def client(self):
+        """Ollama client, created on first use so importing this module stays cheap.
+        It wraps a pooled httpx.Client, so list/generate calls from worker threads
+        reuse keep-alive connections instead of reconnecting per request."""
+        import ollama
+        return ollama.Client(**self._client_options())
+    
+    @functools.cached_property
+    def aclient(self):
+        """Async Ollama client; lets the ASGI server overlap in-flight requests, which
+        Ollama serves concurrently when OLLAMA_NUM_PARALLEL > 1"""
+        import ollama
+        return ollama.AsyncClient(**self._client_options())
+    
+    @functools.cached_property
+    def _generation_slots(self):
+        """Caps in-flight async generations at Ollama's parallel slot count.
+        
+        Ollama already batches the requests it is serving in parallel; anything beyond
+        OLLAMA_NUM_PARALLEL would only queue server-side while holding a connection, so
+        extra callers wait here instead. Created lazily so it binds to the running loop.
+        """
+        return asyncio.Semaphore(OLLAMA_NUM_PARALLEL)
+    
+    def check_model_availability(self):
+        """Check if Phi-4 Mini model is available in Ollama (cached for a short TTL)"""
+        if time.monotonic() - self._avail_checked_at < self._avail_ttl:
+            return self.is_model_available
+        
+        with self._avail_lock:
+            # Another thread may have refreshed the cache while we waited
+            if time.monotonic() - self._avail_checked_at < self._avail_ttl:
+                return self.is_model_available
+            available = self._probe_model_availability()
+            if available:
+                self._avail_checked_at = time.monotonic()
+            return available
+    
+    def warm_up(self):
+        """Load the model into memory with a 1-token generation so the first real request is warm"""
+        try:
+            self.client.generate(
                 model=self.model_name,
-                prompt=prompt,
-                stream=False,
-                options={
-                    "temperature": 0.3,  # Lower temperature for more focused responses
-                    "num_predict": 1000,  # More tokens for detailed repair plans
-                    "top_p": 0.9
-                    # Removed stop tokens that were cutting off markdown code blocks
-                }
+                prompt="ok",
+                options={**REPAIR_PLAN_OPTIONS, "num_predict": 1},
+                keep_alive=KEEP_ALIVE
             )
+            return True
+        except Exception as e:
+            logger.warning("Error warming up Phi-4 model: %s", e)
+            return False
+    
+    async def _acheck_model_availability(self):
+        """Async availability check that only leaves the event loop when the cache is stale"""
+        if time.monotonic() - self._avail_checked_at < self._avail_ttl:
+            return self.is_model_available
+        return await asyncio.to_thread(self.check_model_availability)
+    
+    def _probe_model_availability(self):
+        """Query Ollama for installed models and resolve the phi4-mini tag"""
+        try:
+            models_response = self.client.list()
+            logger.debug("Ollama response type: %s", type(models_response))
             
-            response_text = response['response'].strip()
-            print(f"Phi-4 response received: {response_text[:200]}...")
-            
-            # Extract JSON from response
-            try:
-                # Clean the response
-                response_text = response_text.strip()
-                
-                # Remove markdown code blocks if present
-                if "```json" in response_text:
-                    start = response_text.find("```json") + 7
-                    end = response_text.find("```", start)
-                    if end != -1:
-                        response_text = response_text[start:end].strip()
-                elif "```" in response_text:
-                    start = response_text.find("```") + 3
-                    end = response_text.find("```", start)
-                    if end != -1:
-                        response_text = response_text[start:end].strip()
-                
-                # Find the JSON part
-                start_idx = response_text.find('{')
-                end_idx = response_text.rfind('}') + 1
-                
-                if start_idx == -1 or end_idx == 0:
-                    print(f"No JSON brackets found. Raw response: {response_text}")
-                    raise ValueError("No JSON found in response")
+            if hasattr(models_response, 'models') or 'models' in models_response:
+                # Handle both object and dict responses
+                models = models_response.models if hasattr(models_response, 'models') else models_response['models']
                 
-                json_str = response_text[start_idx:end_idx]
-                print(f"Extracted JSON: {json_str[:200]}...")
+                # Single pass: take the configured tag if installed, else the first phi4-mini tag
+                fallback_name = None
+                for model in models:
+                    # Handle both object and dict model representations
+                    if hasattr(model, 'model'):
+                        model_name = model.model
+                    elif isinstance(model, dict):
+                        model_name = model.get('name') or model.get('model')
+                    else:
+                        model_name = str(model)
+                    
+                    if model_name == PHI4_MODEL:
+                        fallback_name = model_name
+                        break
+                    if fallback_name is None and model_name and 'phi4-mini' in model_name.lower():
+                        fallback_name = model_name
                 
-                repair_plan = json.loads(json_str)
+                if fallback_name:
+                    self.model_name = fallback_name
+                    self.is_model_available = True
+                    logger.debug("Using model: %s", self.model_name)
+                    return True
                 
-                # Validate required fields
-                required_fields = ['diagnosis', 'steps', 'is_diy']
-                missing_fields = [field for field in required_fields if field not in repair_plan]
+                self.is_model_available = False
+                return False
+            else:
+                logger.debug("No 'models' in response")
+                return False
+        except Exception:
+            logger.exception("Error checking Ollama models")
+            return False
+    
+    def preprocess_image(self, image_path: str) -> bytes:
+        """Prepare image as JPEG bytes for Ollama (the client base64-encodes images= itself)"""
+        from PIL import Image
+        
+        try:
+            # Image.open only parses the header; pixel data is decoded lazily
+            with Image.open(image_path) as image:
+                # Small JPEGs are sent as-is rather than decoded and re-encoded
+                if image.format == 'JPEG' and max(image.size) <= 1024:
+                    with open(image_path, 'rb') as f:
+                        return f.read()
                 
-                if missing_fields:
-                    print(f"Missing fields: {missing_fields}. Plan: {repair_plan}")
-                    raise ValueError(f"Missing required fields: {missing_fields}")
+                if image.format == 'JPEG':
+                    # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 in the DCT domain
+                    image.draft('RGB', (1024, 1024))
                 
-                print("✅ Successfully generated repair plan with Phi-4")
-                return repair_plan
+                # Resize if too large (thumbnail is a no-op when the image already fits)
+                image.thumbnail((1024, 1024), Image.LANCZOS)
                 
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"❌ Failed to parse Phi-4 JSON response: {e}")
-                print(f"Full raw response: {response_text}")
+                buffer = _get_scratch_buffer()
+                image.save(buffer, format='JPEG', quality=85, optimize=False, progressive=False)
+                return buffer.getvalue()
+        except Exception:
+            logger.exception("Error preprocessing image %s", image_path)
+            return None
+    
+    def _build_repair_prompt(self, description: str) -> str:
+        """Build the repair plan prompt for an issue description"""
+        return f"{_REPAIR_PROMPT_PREFIX}{description}{_REPAIR_PROMPT_SUFFIX}"
+
+    def _parse_repair_plan(self, response_text: str) -> dict:
+        """Parse and validate the repair plan JSON from a Phi-4 response"""
+        logger.debug("Phi-4 response received: %.200s...", response_text)
+        
+        try:
+            # format="json" constrains decoding to a single JSON object, so no fence/bracket stripping is needed.
+            # pydantic-core parses and validates the raw JSON in one pass, with no intermediate dict.
+            plan = RepairPlan.model_validate_json(response_text)
+            # Drop unset optionals so downstream .get() defaults behave as before
+            repair_plan = plan.model_dump(exclude_none=True)
+            
+            logger.info("Successfully generated repair plan with Phi-4")
+            return repair_plan
+            
+        except ValidationError as e:
+            logger.debug("Full raw response: %s", response_text)
+            # Syntax errors come back as a single json_invalid error; anything else is a schema mismatch
+            if any(error["type"] == "json_invalid" for error in e.errors()):
+                logger.error("Failed to parse Phi-4 JSON response: %s", e)
                 raise Exception(f"Phi-4 returned invalid JSON: {e}")
-                
+            logger.error("Phi-4 repair plan does not match the expected schema: %s", e)
+            raise Exception(f"Phi-4 returned a repair plan with the wrong shape: {e}")
+    
+    def _short_circuit_plan(self, description: str) -> Optional[dict]:
+        """Return the rule-based plan for descriptions that don't need the LLM, else None"""
+        # Only called on the event loop, so the counters need no lock
+        self._plan_requests += 1
+        category = _short_circuit_category(description)
+        if category is None:
+            return None
+        self._short_circuit_hits += 1
+        logger.info(
+            "Short-circuited repair plan for %r (hit rate %d/%d)",
+            description, self._short_circuit_hits, self._plan_requests
+        )
+        return self._fallback_repair_plan(description, category)
+    
+    async def agenerate_repair_plan(self, image_path: str, description: str, force_reanalyze: bool = False) -> dict:
+        """Generate repair plan using Phi-4 Mini via Ollama, without blocking the event loop"""
+        logger.info("Generating repair plan for: %s", description)
+        
+        # A forced reanalysis asks for a model plan, never the canned template
+        if not force_reanalyze:
+            plan = self._short_circuit_plan(description)
+            if plan is not None:
+                return plan
+        
+        if not await self._acheck_model_availability():
+            raise Exception("Phi-4 Mini model is not available. Please ensure Ollama is running and phi4-mini is installed.")
+        
+        try:
+            prompt = self._build_repair_prompt(description)
+            logger.debug("Sending request to Phi-4...")
+            async with self._generation_slots:
+                response = await self.aclient.generate(
+                    model=self.model_name,
+                    prompt=prompt,
+                    stream=False,
+                    format="json",
+                    options=REANALYZE_OPTIONS if force_reanalyze else REPAIR_PLAN_OPTIONS,
+                    keep_alive=KEEP_ALIVE
+                )
+            return self._parse_repair_plan(response['response'])
         except Exception as e:
-            print(f"❌ Phi-4 generation failed: {e}")
+            logger.error("Phi-4 generation failed: %s", e)
             raise Exception(f"Failed to generate repair plan with Phi-4: {e}")
     
-    def _fallback_repair_plan(self, description: str) -> dict:
+    def _fallback_repair_plan(self, description: str, category: Optional[str] = None) -> dict:
         """Fallback repair plan when model is not available"""
-        # Determine if it's likely electrical, plumbing, or general
-        description_lower = description.lower()
-        is_electrical = any(word in description_lower for word in ['electrical', 'wire', 'outlet', 'switch', 'light', 'power'])
-        is_plumbing = any(word in description_lower for word in ['water', 'pipe', 'leak', 'faucet', 'drain', 'toilet'])
+        # Determine if it's likely electrical, plumbing, or general (memoized per description)
+        label, plan = _FALLBACK_PLANS[category or _classify_description(description.strip().lower())]
+        return {"diagnosis": f"{label} issue identified from description: {description}", **plan}
+    
+    def _build_chat_prompt(self, message: str, context: str = "") -> str:
+        """Build the chat prompt for a user question and optional repair context"""
+        return f"{_CHAT_PROMPT_PREFIX}{context or _NO_CHAT_CONTEXT}{_CHAT_PROMPT_QUESTION}{message}{_CHAT_PROMPT_SUFFIX}"
+    
+    def _build_chat_request(self, message: str, context: str, session_id: Optional[str]):
+        """Return (prompt, ollama_context) for a chat turn.
         
-        if is_electrical:
-            return {
-                "diagnosis": f"Electrical issue identified from description: {description}",
-                "steps": [
-                    {
-                        "step": 1,
-                        "instruction": "Turn off power at the circuit breaker",
-                        "tools_needed": ["circuit breaker access"],
-                        "estimated_time": "2 minutes"
-                    },
-                    {
-                        "step": 2,
-                        "instruction": "Contact a licensed electrician for safety",
-                        "tools_needed": ["phone"],
-                        "estimated_time": "5 minutes"
-                    }
-                ],
-                "is_diy": False,
-                "estimated_time": "Professional consultation required",
-                "estimated_cost": "$100-400",
-                "safety_warnings": ["Never work on live electrical circuits", "Always turn off power at breaker", "Use proper electrical tools"],
-                "recommended_provider": "electrical"
-            }
-        elif is_plumbing:
-            return {
-                "diagnosis": f"Plumbing issue identified from description: {description}",
-                "steps": [
-                    {
-                        "step": 1,
-                        "instruction": "Turn off water supply to the affected area",
-                        "tools_needed": ["water shut-off valve access"],
-                        "estimated_time": "2 minutes"
-                    },
-                    {
-                        "step": 2,
-                        "instruction": "Assess the extent of the problem",
-                        "tools_needed": ["flashlight", "basic tools"],
-                        "estimated_time": "10 minutes"
-                    },
-                    {
-                        "step": 3,
-                        "instruction": "For complex issues, contact a plumber",
-                        "tools_needed": ["phone"],
-                        "estimated_time": "5 minutes"
-                    }
-                ],
-                "is_diy": False,
-                "estimated_time": "30-60 minutes assessment",
-                "estimated_cost": "$50-300",
-                "safety_warnings": ["Turn off water to prevent flooding", "Be careful with old pipes"],
-                "recommended_provider": "plumbing"
-            }
-        else:
-            return {
-                "diagnosis": f"General issue identified from description: {description}",
-                "steps": [
-                    {
-                        "step": 1,
-                        "instruction": "Assess the damage and gather necessary tools",
-                        "tools_needed": ["basic toolkit", "safety equipment"],
-                        "estimated_time": "10 minutes"
-                    },
-                    {
-                        "step": 2,
-                        "instruction": "Clean the area and remove any debris",
-                        "tools_needed": ["cleaning supplies", "gloves"],
-                        "estimated_time": "15 minutes"
-                    },
-                    {
-                        "step": 3,
-                        "instruction": "Follow manufacturer guidelines or consult professional if complex",
-                        "tools_needed": ["manual", "appropriate tools"],
-                        "estimated_time": "30 minutes"
-                    }
-                ],
-                "is_diy": True,
-                "estimated_time": "45 minutes to 1 hour",
-                "estimated_cost": "$20-100",
-                "safety_warnings": ["Wear protective equipment", "Ensure area is safe to work"],
-                "recommended_provider": "general"
-            }
+        Follow-up turns in a known session resend only the new question and pass the
+        previous turn's context tokens, so Ollama skips re-prefilling the system prompt.
+        Sessions that have grown close to the context window start over from the full prompt.
+        """
+        session_context = self._session_contexts.get(session_id) if session_id else None
+        if session_context is not None and len(session_context) <= _MAX_SESSION_CONTEXT_TOKENS:
+            return f"{_CHAT_PROMPT_FOLLOW_UP}{message}{_CHAT_PROMPT_SUFFIX}", session_context
+        return self._build_chat_prompt(message, context), None
+    
+    def _save_session_context(self, session_id: Optional[str], session_context: Optional[List[int]]):
+        """Remember a session's context tokens, evicting the least recently used sessions"""
+        if session_id and session_context:
+            self._session_contexts.put(session_id, session_context)
     
-    def chat_response(self, message: str, context: str = "") -> str:
-        """Generate chat response using Phi-4 Mini"""
+    def _chat_cache_key(self, message: str, context: str, session_context: Optional[List[int]]):
+        """Response cache key for a chat turn, or None for follow-ups that depend on session history"""
+        if session_context is not None:
+            return None
+        # Case, spacing and trailing punctuation don't change the question
+        return context, " ".join(message.lower().split()).rstrip("?!. ")
+
+    def _cached_chat_response(self, cache_key, session_id: Optional[str]) -> Optional[str]:
+        """Cached answer for an opening question, or None.
+        
+        The turn's context tokens are cached with the answer and restored into the session,
+        so a cached opening continues into follow-ups just like a freshly generated one.
+        """
+        cached = self._chat_responses.get(cache_key) if cache_key else None
+        if cached is None:
+            return None
+        response_text, response_context = cached
+        self._save_session_context(session_id, response_context)
+        return response_text
+
+    async def achat_response(self, message: str, context: str = "", session_id: Optional[str] = None) -> str:
+        """Generate chat response using Phi-4 Mini, without blocking the event loop"""
         
-        if not self.check_model_availability():
+        if not await self._acheck_model_availability():
             raise Exception("Phi-4 Mini model is not available. Please ensure Ollama is running.")
         
         try:
-            prompt = f"""
-You are HouseHelp.AI, an expert home repair assistant. Answer the user's question based on the repair context provided.
-
-Repair Context: {context if context else "No specific repair context provided."}
-
-User Question: {message}
-
-Provide a helpful, specific answer about the repair process. Include:
-- Specific guidance related to their question
-- Safety considerations if relevant  
-- Tool recommendations if applicable
-- Step-by-step advice when appropriate
-
-Keep your response informative but concise (2-4 sentences).
-"""
+            prompt, session_context = self._build_chat_request(message, context, session_id)
+            logger.debug("Phi-4 chat request: %s", message)
+            cache_key = self._chat_cache_key(message, context, session_context)
+            cached = self._cached_chat_response(cache_key, session_id)
+            if cached is not None:
+                logger.debug("Chat response cache hit: %s", message)
+                return cached
             
-            print(f"Phi-4 chat request: {message}")
-            response = self.client.generate(
-                model=self.model_name,
-                prompt=prompt,
-                stream=False,
-                options={
-                    "temperature": 0.7,
-                    "num_predict": 200,  # Concise responses
-                    "top_p": 0.9,
-                }
-            )
+            async with self._generation_slots:
+                response = await self.aclient.generate(
+                    model=self.model_name,
+                    prompt=prompt,
+                    context=session_context,
+                    stream=False,
+                    options=CHAT_OPTIONS,
+                    keep_alive=KEEP_ALIVE
+                )
+            self._save_session_context(session_id, response.get('context'))
             
             response_text = response['response'].strip()
-            print(f"Phi-4 chat response: {response_text}")
+            logger.debug("Phi-4 chat response: %s", response_text)
+            if cache_key:
+                self._chat_responses.put(cache_key, (response_text, response.get('context')))
             return response_text
             
         except Exception as e:
-            print(f"❌ Phi-4 chat failed: {e}")
+            logger.error("Phi-4 chat failed: %s", e)
             raise Exception(f"Failed to generate chat response with Phi-4: {e}")
 
-# Global instance
-phi4_service = Phi4Service()
\ No newline at end of file
+    async def achat_stream(self, message: str, context: str = "", session_id: Optional[str] = None):
+        """Stream chat response tokens from Phi-4 Mini as they are generated"""
+        
+        if not await self._acheck_model_availability():
+            raise Exception("Phi-4 Mini model is not available. Please ensure Ollama is running.")
+        
+        prompt, session_context = self._build_chat_request(message, context, session_id)
+        logger.debug("Phi-4 chat stream request: %s", message)
+        # The slot is held for the whole stream, since Ollama keeps generating until done
+        async with self._generation_slots:
+            async for chunk in await self.aclient.generate(
+                model=self.model_name,
+                prompt=prompt,
+                context=session_context,
+                stream=True,
+                options=CHAT_OPTIONS,
+                keep_alive=KEEP_ALIVE
+            ):
+                if chunk.get('done'):
+                    # Only the final chunk carries the context tokens
+                    self._save_session_context(session_id, chunk.get('context'))
+                yield chunk['response']
+
+@functools.lru_cache(maxsize=None)
+def get_phi4_service() -> Phi4Service:
+    """Shared Phi4Service instance, constructed on first use"""
+    return Phi4Service()
\ No newline at end of file
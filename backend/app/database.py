@@ -1,12 +1,44 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, Boolean
+from sqlalchemy import create_engine, event, text, Column, Index, Integer, String, DateTime, Float, Text, Boolean, JSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker, Session, deferred
 from datetime import datetime
 import os
+import orjson
 
 # Database setup
 DATABASE_URL = "sqlite:///./househelp.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _dumps_json(value) -> str:
+    # Sorted keys keep the stored form deterministic for identical plans
+    return orjson.dumps(value, option=orjson.OPT_SORT_KEYS).decode()
+
+def _loads_json(value):
+    # Unreadable legacy values load as None, so the analysis is simply regenerated
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return None
+
+engine = create_engine(
+    DATABASE_URL,
+    json_serializer=_dumps_json,
+    json_deserializer=_loads_json,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True
+)
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside a writer; NORMAL sync is safe under WAL and fsyncs less
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -18,10 +50,11 @@ class Issue(Base):
     image_path = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     voice_note_path = Column(String, nullable=True)
-    diagnosis = Column(Text, nullable=True)
-    repair_plan = Column(Text, nullable=True)  # JSON string
+    # Analysis output can be large; load it only when a query asks for the "analysis" group
+    diagnosis = deferred(Column(Text, nullable=True), group="analysis")
+    repair_plan = deferred(Column(JSON(none_as_null=True), nullable=True), group="analysis")
     is_diy = Column(Boolean, default=True)
-    status = Column(String, default="new")  # new, in-progress, completed
+    status = Column(String, default="new", index=True)  # new, in-progress, completed
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -30,7 +63,7 @@ class MaintenanceProvider(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    specialty = Column(String, nullable=False)
+    specialty = Column(String, nullable=False, index=True)
     contact_info = Column(String, nullable=False)
     email = Column(String, nullable=True)
     phone = Column(String, nullable=True)
@@ -40,6 +73,11 @@ class MaintenanceProvider(Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # Serves get_audit_logs' per-issue ORDER BY created_at DESC (SQLite scans it backwards),
+        # and as its leftmost column, every other lookup by issue_id
+        Index("ix_audit_issue_created", "issue_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     issue_id = Column(Integer, nullable=False)
@@ -48,11 +86,32 @@ class AuditLog(Base):
     status = Column(String, nullable=False)  # completed, failed, in-progress
     notes = Column(Text, nullable=True)
     completed_by = Column(String, nullable=True)  # diy or provider name
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class RepairPlanCache(Base):
+    __tablename__ = "repair_plan_cache"
+    __table_args__ = (Index("ix_repair_plan_cache_key", "image_path", "description_hash", unique=True),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    image_path = Column(String, nullable=False)  # content-addressed, so equal paths mean equal images
+    description_hash = Column(String, nullable=False)
+    repair_plan = Column(JSON, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# Indexes earlier versions created that ix_audit_issue_created now covers
+_OBSOLETE_INDEXES = ("ix_audit_logs_issue_id", "ix_audit_issue_status")
+
 # Create tables
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    # create_all only builds indexes for new tables; add any missing ones to existing databases
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # ...and drop the redundant ones, which only cost writes
+    with engine.begin() as connection:
+        for name in _OBSOLETE_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
 
 # Dependency to get DB session
 def get_db():
@@ -67,8 +126,9 @@ def initialize_sample_data():
     db = SessionLocal()
     try:
         # Check if providers already exist
-        existing_providers = db.query(MaintenanceProvider).count()
-        if existing_providers == 0:
+        # LIMIT 1 existence check instead of COUNT(*) over the whole table
+        has_providers = db.query(MaintenanceProvider.id).limit(1).scalar() is not None
+        if not has_providers:
             # Add sample maintenance providers
             providers = [
                 MaintenanceProvider(
@@ -101,13 +161,13 @@ def initialize_sample_data():
                 )
             ]
             
-            for provider in providers:
-                db.add(provider)
+            # One executemany INSERT, skipping identity-map bookkeeping
+            db.bulk_save_objects(providers)
             db.commit()
         
         # Add sample audit logs if none exist
-        existing_audits = db.query(AuditLog).count()
-        if existing_audits == 0:
+        has_audits = db.query(AuditLog.id).limit(1).scalar() is not None
+        if not has_audits:
             # Get some existing issues to create audit logs for
             issues = db.query(Issue).limit(3).all()
             sample_audits = []
@@ -124,8 +184,7 @@ def initialize_sample_data():
                 )
                 sample_audits.append(audit)
             
-            for audit in sample_audits:
-                db.add(audit)
+            db.bulk_save_objects(sample_audits)
             db.commit()
             print(f"Added {len(sample_audits)} sample audit logs")
             
@@ -1,66 +1,101 @@
+import functools
+
+import orjson
+
+# Single-pass cleanup of step text for Mermaid labels
+_MERMAID_TEXT_TABLE = str.maketrans({'"': "'", '\n': ' '})
+
+def _cache_key(steps, is_diy) -> str:
+    """Canonical JSON key for a chart's inputs; the diagnosis text never affects the chart"""
+    return orjson.dumps({"steps": steps, "is_diy": is_diy}, option=orjson.OPT_SORT_KEYS).decode()
+
 def generate_mermaid_flowchart(repair_plan: dict) -> str:
     """Generate Mermaid.js flowchart from repair plan"""
-    steps = repair_plan.get("steps", [])
-    is_diy = repair_plan.get("is_diy", True)
-    
-    mermaid_code = "flowchart TD\n"
-    mermaid_code += "    A[Start: Issue Identified] --> B[Assess Damage]\n"
-    
+    return _generate_mermaid_cached(_cache_key(repair_plan.get("steps", []), repair_plan.get("is_diy", True)))
+
+@functools.lru_cache(maxsize=128)
+def _generate_mermaid_cached(key: str) -> str:
+    """Build the Mermaid chart for a cache key from _cache_key"""
+    chart_input = orjson.loads(key)
+    steps = chart_input["steps"]
+    is_diy = chart_input["is_diy"]
+
+    lines = [
+        "flowchart TD",
+        "    A[Start: Issue Identified] --> B[Assess Damage]",
+    ]
+
+    # Step nodes S0, S1, ...; letters would run past Z on long plans
+    node_ids = [f"S{i}" for i in range(len(steps) + 1)]
+
     # Add steps
     for i, step in enumerate(steps):
-        current_node = chr(ord('C') + i)  # C, D, E, etc.
-        next_node = chr(ord('C') + i + 1)
-        
+        current_node = node_ids[i]
+        next_node = node_ids[i + 1]
+
         step_text = step.get("instruction", f"Step {step.get('step', i+1)}")
         # Clean text for Mermaid
-        step_text = step_text.replace('"', "'").replace('\n', ' ')[:50]
-        
-        mermaid_code += f"    B --> {current_node}[\"{step_text}\"]\n"
-        
+        step_text = step_text.translate(_MERMAID_TEXT_TABLE)[:50]
+
+        lines.append(f"    B --> {current_node}[\"{step_text}\"]")
+
         if i < len(steps) - 1:
-            mermaid_code += f"    {current_node} --> {next_node}\n"
+            lines.append(f"    {current_node} --> {next_node}")
         else:
             # Last step
             if is_diy:
-                mermaid_code += f"    {current_node} --> END[DIY Complete]\n"
+                lines.append(f"    {current_node} --> END[DIY Complete]")
             else:
-                mermaid_code += f"    {current_node} --> PROF[Call Professional]\n"
-                mermaid_code += "    PROF --> END[Issue Resolved]\n"
-    
+                lines.append(f"    {current_node} --> PROF[Call Professional]")
+                lines.append("    PROF --> END[Issue Resolved]")
+
     # Add decision point for complex repairs
     if not is_diy:
-        mermaid_code += "    B --> DECISION{Complex Repair?}\n"
-        mermaid_code += "    DECISION -->|Yes| PROF\n"
-        mermaid_code += "    DECISION -->|No| C\n"
-    
-    return mermaid_code
+        lines.append("    B --> DECISION{Complex Repair?}")
+        lines.append("    DECISION -->|Yes| PROF")
+        lines.append(f"    DECISION -->|No| {node_ids[0]}")
+
+    lines.append("")
+    return "\n".join(lines)
 
 def create_simple_flowchart(steps: list, is_diy: bool = True) -> str:
     """Create a simple text-based flowchart"""
-    flowchart = "REPAIR FLOWCHART\n"
-    flowchart += "=" * 50 + "\n\n"
-    
-    flowchart += "1. START: Issue Identified\n"
-    flowchart += "   ↓\n"
-    flowchart += "2. Assess the damage\n"
-    flowchart += "   ↓\n"
-    
+    return _create_simple_cached(_cache_key(steps, is_diy))
+
+@functools.lru_cache(maxsize=128)
+def _create_simple_cached(key: str) -> str:
+    """Build the text chart for a cache key from _cache_key"""
+    chart_input = orjson.loads(key)
+    steps = chart_input["steps"]
+    is_diy = chart_input["is_diy"]
+
+    lines = [
+        "REPAIR FLOWCHART",
+        "=" * 50,
+        "",
+        "1. START: Issue Identified",
+        "   ↓",
+        "2. Assess the damage",
+        "   ↓",
+    ]
+
     for i, step in enumerate(steps, 3):
         instruction = step.get("instruction", f"Step {step.get('step', i-2)}")
         tools = step.get("tools_needed", [])
         time = step.get("estimated_time", "Unknown")
-        
-        flowchart += f"{i}. {instruction}\n"
+
+        lines.append(f"{i}. {instruction}")
         if tools:
-            flowchart += f"   Tools: {', '.join(tools)}\n"
-        flowchart += f"   Time: {time}\n"
-        flowchart += "   ↓\n"
-    
+            lines.append(f"   Tools: {', '.join(tools)}")
+        lines.append(f"   Time: {time}")
+        lines.append("   ↓")
+
     if is_diy:
-        flowchart += f"{len(steps) + 3}. END: DIY Repair Complete!\n"
+        lines.append(f"{len(steps) + 3}. END: DIY Repair Complete!")
     else:
-        flowchart += f"{len(steps) + 3}. DECISION: Call Professional\n"
-        flowchart += "   ↓\n"
-        flowchart += f"{len(steps) + 4}. END: Professional Repair Complete!\n"
-    
-    return flowchart
\ No newline at end of file
+        lines.append(f"{len(steps) + 3}. DECISION: Call Professional")
+        lines.append("   ↓")
+        lines.append(f"{len(steps) + 4}. END: Professional Repair Complete!")
+
+    lines.append("")
+    return "\n".join(lines)
@@ -1,25 +1,67 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, case, event, exists, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, undefer_group
+import asyncio
+import hashlib
+import io
+import logging
 import os
-import uuid
-import json
 import shutil
+import tempfile
+import threading
+import time
+import uuid
+import orjson
+from datetime import datetime
 from typing import List, Optional
 
-from app.database import get_db, create_tables, initialize_sample_data, Issue, MaintenanceProvider, AuditLog
+from app.database import SessionLocal, get_db, create_tables, initialize_sample_data, Issue, MaintenanceProvider, AuditLog, RepairPlanCache
 from app.schemas import (
-    IssueCreate, IssueResponse, IssueUpdate,
+    IssueCreate, IssueResponse, IssuePage, IssueUpdate,
     MaintenanceProviderCreate, MaintenanceProviderResponse,
-    AuditLogCreate, AuditLogResponse,
+    AuditLogCreate, AuditLogResponse, AuditLogPage,
     ChatMessage, ChatResponse, RepairPlan
 )
-from app.ai_service import phi4_service
+from app.ai_service import get_phi4_service
 from app.flowchart_service import generate_mermaid_flowchart, create_simple_flowchart
 
+# Service modules log through the logging package; set LOG_LEVEL=DEBUG to trace Ollama calls
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+# Endpoints that only do blocking work (SQLite via the sync Session, file writes, the sync
+# Ollama client) are plain `def` so FastAPI runs them in its threadpool instead of on the
+# event loop; async endpoints push their DB lookups to the threadpool explicitly.
+
 # Create FastAPI app
-app = FastAPI(title="HouseHelp.AI API", version="1.0.0")
+app = FastAPI(title="HouseHelp.AI API", version="1.0.0", default_response_class=ORJSONResponse)
+
+# Largest request body accepted (image plus optional voice note), checked against
+# Content-Length before any of the body is read
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+
+class MaxBodySizeMiddleware:
+    """Reject requests whose declared Content-Length exceeds the limit with 413"""
+    
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"content-length" and value.isdigit() and int(value) > self.max_body_size:
+                    response = ORJSONResponse(status_code=413, content={"detail": "Upload too large"})
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+# Added before CORS so CORS wraps it and browsers can read the 413
+app.add_middleware(MaxBodySizeMiddleware, max_body_size=MAX_UPLOAD_BYTES)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,21 +72,93 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve uploaded files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles for content-addressed uploads, which never change once written"""
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
 
-# Create tables on startup
-@app.on_event("startup")
-async def startup_event():
-    create_tables()
-    initialize_sample_data()
-    # Check if Ollama and Phi-4 Mini are available
+# Serve uploaded files for local development; in production nginx serves /uploads
+# directly (see README) and SERVE_UPLOADS=0 keeps image traffic off the event loop.
+# StaticFiles requires the directory to exist at mount time
+os.makedirs("uploads", exist_ok=True)
+if os.getenv("SERVE_UPLOADS", "1") != "0":
+    app.mount("/uploads", ImmutableStaticFiles(directory="uploads"), name="uploads")
+
+# Short-lived cache for read-heavy, rarely changing responses (dashboard, providers).
+# Any committed DB write clears it, so mutations are visible on the next request.
+DASHBOARD_CACHE_TTL = 60
+PROVIDERS_CACHE_TTL = 300
+_response_cache = {}
+_response_cache_generation = 0
+_response_cache_lock = threading.Lock()
+
+def get_cached_response(key, ttl: float, compute):
+    """Return the cached value for key, calling compute() when it is missing or expired"""
+    entry = _response_cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    
+    generation = _response_cache_generation
+    value = compute()
+    with _response_cache_lock:
+        # Don't store a result computed while a concurrent commit invalidated the cache
+        if generation == _response_cache_generation:
+            _response_cache[key] = (time.monotonic() + ttl, value)
+    return value
+
+@event.listens_for(SessionLocal, "after_commit")
+def clear_response_cache(session):
+    """Drop cached responses after any committed write"""
+    global _response_cache_generation
+    with _response_cache_lock:
+        _response_cache_generation += 1
+        _response_cache.clear()
+
+# Background model check started at boot; /health reports 503 until it has finished
+model_check_task: Optional[asyncio.Task] = None
+
+def verify_model():
+    """Check if Ollama and Phi-4 Mini are available, and load the model if so"""
+    phi4_service = get_phi4_service()
     if phi4_service.check_model_availability():
         print("✅ Phi-4 Mini model is available via Ollama")
+        # Load the model now so the first user request doesn't pay the cold start
+        phi4_service.warm_up()
     else:
         print("⚠️  Phi-4 Mini model not found. Please ensure Ollama is running and phi4-mini is installed.")
         print("   Run: ollama pull phi4-mini")
 
+# Queued analyses (POST /analyze?wait=false) are run by a fixed pool of background workers
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+ANALYSIS_QUEUE_SIZE = 256
+analysis_queue: Optional[asyncio.Queue] = None
+analysis_workers: List[asyncio.Task] = []
+# Issue ids that are queued or being analyzed; GET /plan answers 202 for these
+pending_analyses = set()
+# Error message of each issue's last failed queued analysis, until it is re-queued or succeeds
+failed_analyses = {}
+
+# Create tables on startup
+@app.on_event("startup")
+async def startup_event():
+    global model_check_task, analysis_queue
+    create_tables()
+    initialize_sample_data()
+    # The Ollama probe and warm-up can take many seconds; run them without delaying boot
+    model_check_task = asyncio.create_task(asyncio.to_thread(verify_model))
+    analysis_queue = asyncio.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+    analysis_workers.extend(asyncio.create_task(analysis_worker()) for _ in range(ANALYSIS_WORKERS))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for worker in analysis_workers:
+        worker.cancel()
+    await asyncio.gather(*analysis_workers, return_exceptions=True)
+    analysis_workers.clear()
+
 # Health check
 @app.get("/")
 async def root():
@@ -52,9 +166,106 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    if model_check_task is None or not model_check_task.done():
+        return ORJSONResponse(status_code=503, content={"status": "starting", "service": "HouseHelp.AI API"})
     return {"status": "healthy", "service": "HouseHelp.AI API"}
 
+# List endpoints return keyset-paginated pages of at most MAX_PAGE_SIZE rows
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def paginate(query, limit: int, cursor_of=lambda row: row.id) -> dict:
+    """Fetch one page from an ordered query and the cursor for the next page, if any"""
+    # One extra row tells us whether another page exists without a COUNT
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = cursor_of(items[-1]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
 # Issue endpoints
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Leading bytes of the image formats the upload form accepts (JPEG, PNG, GIF, BMP, WebP)
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"BM")
+
+def is_image_header(header: bytes) -> bool:
+    """Check a file's first bytes against known image signatures (client MIME types can't be trusted)"""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return True
+    return header.startswith(IMAGE_SIGNATURES)
+
+def content_hash(data: bytes) -> str:
+    """Short hex digest used to content-address uploads and descriptions"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def disk_fileno(file) -> Optional[int]:
+    """OS file descriptor backing an upload, or None while it is still buffered in memory"""
+    # Asking a SpooledTemporaryFile for fileno() would force it onto disk
+    if isinstance(file, tempfile.SpooledTemporaryFile) and not file._rolled:
+        return None
+    try:
+        return file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+def copy_upload(source, destination):
+    """Copy an upload to an open file, in-kernel via sendfile when the upload is on disk"""
+    source_fd = disk_fileno(source)
+    if source_fd is not None and hasattr(os, "sendfile"):
+        size = os.fstat(source_fd).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(destination.fileno(), source_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        except OSError:
+            # Some platforms only sendfile to sockets; fall back to a userspace copy
+            destination.seek(0)
+            destination.truncate()
+    
+    source.seek(0)
+    shutil.copyfileobj(source, destination, UPLOAD_CHUNK_SIZE)
+
+def save_upload(upload: UploadFile) -> str:
+    """Store an upload under its content hash and return its path.
+    
+    Identical files map to the same path, so re-submitted images are stored once and
+    share cached repair plans.
+    """
+    # Hash first so a duplicate upload never gets written at all
+    hasher = hashlib.blake2b(digest_size=16)
+    upload.file.seek(0)
+    while chunk := upload.file.read(UPLOAD_CHUNK_SIZE):
+        hasher.update(chunk)
+    
+    path = f"uploads/{hasher.hexdigest()}.{upload.filename.split('.')[-1]}"
+    if os.path.exists(path):
+        return path
+    
+    temp_path = f"uploads/.{uuid.uuid4()}.part"
+    with open(temp_path, "wb") as buffer:
+        copy_upload(upload.file, buffer)
+    os.replace(temp_path, path)
+    return path
+
+def add_issue(db: Session, image_path: str, description: str, voice_note_path: Optional[str]) -> IssueResponse:
+    """Insert a new issue row and build its response"""
+    db_issue = Issue(
+        image_path=image_path,
+        description=description,
+        voice_note_path=voice_note_path
+    )
+    db.add(db_issue)
+    db.commit()
+    # Reload every column, the deferred analysis ones included, in one SELECT and build the
+    # response here in the threadpool; validating the ORM object on the event loop would lazy-load them
+    db.refresh(db_issue, attribute_names=[column.key for column in Issue.__table__.columns])
+    
+    return IssueResponse.model_validate(db_issue)
+
 @app.post("/api/issues/", response_model=IssueResponse)
 async def create_issue(
     description: str = Form(...),
@@ -63,92 +274,172 @@ async def create_issue(
     db: Session = Depends(get_db)
 ):
     """Create a new issue with image upload"""
-    # Validate image file
-    if not image.content_type.startswith("image/"):
+    # Validate image file by its content rather than the client-supplied content type
+    header = await image.read(16)
+    if not is_image_header(header):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Generate unique filename
-    image_filename = f"{uuid.uuid4()}.{image.filename.split('.')[-1]}"
-    image_path = f"uploads/{image_filename}"
-    
     # Save image
-    os.makedirs("uploads", exist_ok=True)
-    with open(image_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+    saves = [asyncio.to_thread(save_upload, image)]
     
     # Handle voice note if provided
-    voice_note_path = None
     if voice_note:
-        voice_filename = f"{uuid.uuid4()}.{voice_note.filename.split('.')[-1]}"
-        voice_note_path = f"uploads/{voice_filename}"
-        with open(voice_note_path, "wb") as buffer:
-            shutil.copyfileobj(voice_note.file, buffer)
+        saves.append(asyncio.to_thread(save_upload, voice_note))
     
-    # Create issue in database
-    db_issue = Issue(
-        image_path=image_path,
-        description=description,
-        voice_note_path=voice_note_path
-    )
-    db.add(db_issue)
-    db.commit()
-    db.refresh(db_issue)
+    # Write both files concurrently, off the event loop
+    saved_paths = await asyncio.gather(*saves)
+    image_path = saved_paths[0]
+    voice_note_path = saved_paths[1] if voice_note else None
     
-    return db_issue
+    # Create issue in database
+    return await run_in_threadpool(add_issue, db, image_path, description, voice_note_path)
 
-@app.get("/api/issues/", response_model=List[IssueResponse])
-async def get_issues(db: Session = Depends(get_db)):
-    """Get all issues"""
-    return db.query(Issue).all()
+@app.get("/api/issues/", response_model=IssuePage)
+def get_issues(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get issues newest first (summary fields only; fetch an issue by id for its analysis)"""
+    query = db.query(Issue.id, Issue.description, Issue.status, Issue.is_diy, Issue.created_at)
+    if cursor is not None:
+        query = query.filter(Issue.id < cursor)
+    return paginate(query.order_by(Issue.id.desc()), limit)
 
 @app.get("/api/issues/{issue_id}", response_model=IssueResponse)
-async def get_issue(issue_id: int, db: Session = Depends(get_db)):
+def get_issue(issue_id: int, db: Session = Depends(get_db)):
     """Get specific issue"""
-    issue = db.query(Issue).filter(Issue.id == issue_id).first()
+    issue = db.query(Issue).options(undefer_group("analysis")).filter(Issue.id == issue_id).first()
     if not issue:
         raise HTTPException(status_code=404, detail="Issue not found")
     return issue
 
+@app.get("/api/issues/{issue_id}/plan", response_model=dict)
+def get_issue_plan(issue_id: int, db: Session = Depends(get_db)):
+    """Get just the repair plan of an analyzed issue"""
+    row = db.query(Issue.repair_plan).filter(Issue.id == issue_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Issue not found")
+    if issue_id in pending_analyses:
+        return ORJSONResponse(status_code=202, content={"status": "queued", "issue_id": issue_id})
+    if issue_id in failed_analyses:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {failed_analyses[issue_id]}")
+    if not row.repair_plan:
+        raise HTTPException(status_code=404, detail="Issue has not been analyzed yet")
+    return row.repair_plan
+
+def load_issue_with_analysis(db: Session, issue_id: int) -> Optional[Issue]:
+    """Fetch an issue together with its deferred analysis columns"""
+    return db.query(Issue).options(undefer_group("analysis")).filter(Issue.id == issue_id).first()
+
+def load_cached_plan(db: Session, image_path: str, description_hash: str) -> Optional[dict]:
+    """Repair plan previously generated for the same image and description, if any"""
+    return db.query(RepairPlanCache.repair_plan).filter(
+        RepairPlanCache.image_path == image_path,
+        RepairPlanCache.description_hash == description_hash
+    ).scalar()
+
+def save_analysis(db: Session, issue: Issue, repair_plan: dict, description_hash: str):
+    """Store a generated repair plan on its issue and in the repair plan cache"""
+    issue.diagnosis = repair_plan.get("diagnosis", "")
+    issue.repair_plan = repair_plan
+    issue.is_diy = repair_plan.get("is_diy", True)
+    issue.status = "analyzed"
+    
+    cache_insert = sqlite_insert(RepairPlanCache).values(
+        image_path=issue.image_path,
+        description_hash=description_hash,
+        repair_plan=repair_plan
+    )
+    db.execute(cache_insert.on_conflict_do_update(
+        index_elements=[RepairPlanCache.image_path, RepairPlanCache.description_hash],
+        set_={"repair_plan": cache_insert.excluded.repair_plan}
+    ))
+    
+    db.commit()
+
+async def run_analysis(db: Session, issue: Issue, force_reanalyze: bool) -> dict:
+    """Generate (or reuse a cached) repair plan for an issue and save it"""
+    # Identical image + description pairs reuse an earlier plan unless reanalysis is forced
+    description_hash = content_hash(issue.description.encode())
+    repair_plan = None
+    if not force_reanalyze:
+        repair_plan = await run_in_threadpool(load_cached_plan, db, issue.image_path, description_hash)
+    
+    if repair_plan is not None:
+        print(f"Reusing cached repair plan for issue {issue.id}")
+    else:
+        print(f"Generating new analysis for issue {issue.id}")
+        # Generate repair plan using AI; the event loop keeps serving other requests meanwhile
+        repair_plan = await get_phi4_service().agenerate_repair_plan(
+            issue.image_path, issue.description, force_reanalyze
+        )
+    
+    # Update issue with analysis
+    await run_in_threadpool(save_analysis, db, issue, repair_plan, description_hash)
+    failed_analyses.pop(issue.id, None)
+    return repair_plan
+
+async def analysis_worker():
+    """Run queued analyses one at a time, each with its own session"""
+    while True:
+        issue_id, force_reanalyze = await analysis_queue.get()
+        db = SessionLocal()
+        try:
+            issue = await run_in_threadpool(load_issue_with_analysis, db, issue_id)
+            if issue:
+                await run_analysis(db, issue, force_reanalyze)
+        except Exception as e:
+            print(f"Error analyzing issue {issue_id}: {str(e)}")
+            # Kept so a client polling GET /plan sees the failure instead of "not analyzed yet"
+            failed_analyses[issue_id] = str(e)
+        finally:
+            db.close()
+            pending_analyses.discard(issue_id)
+            analysis_queue.task_done()
+
 @app.post("/api/issues/{issue_id}/analyze", response_model=dict)
-async def analyze_issue(issue_id: int, force_reanalyze: bool = False, db: Session = Depends(get_db)):
-    """Analyze issue and generate repair plan"""
+async def analyze_issue(
+    issue_id: int,
+    force_reanalyze: bool = False,
+    wait: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Analyze issue and generate repair plan; with wait=false, queue it and return 202 straight away"""
     try:
-        issue = db.query(Issue).filter(Issue.id == issue_id).first()
+        issue = await run_in_threadpool(load_issue_with_analysis, db, issue_id)
         if not issue:
             raise HTTPException(status_code=404, detail="Issue not found")
         
         # Check if analysis already exists and we're not forcing reanalysis
         if issue.repair_plan and issue.diagnosis and not force_reanalyze:
             print(f"Using existing analysis for issue {issue_id}")
-            try:
-                # Return existing analysis
-                repair_plan = json.loads(issue.repair_plan)
-                
-                # Generate flowcharts from existing data
-                mermaid_chart = generate_mermaid_flowchart(repair_plan)
-                text_chart = create_simple_flowchart(repair_plan.get("steps", []), repair_plan.get("is_diy", True))
-                
-                return {
-                    "repair_plan": repair_plan,
-                    "mermaid_flowchart": mermaid_chart,
-                    "text_flowchart": text_chart,
-                    "from_cache": True
-                }
-            except json.JSONDecodeError:
-                print(f"Invalid JSON in repair_plan for issue {issue_id}, regenerating...")
-                # Fall through to regenerate analysis
-        
-        print(f"Generating new analysis for issue {issue_id}")
-        # Generate repair plan using AI
-        repair_plan = phi4_service.generate_repair_plan(issue.image_path, issue.description)
+            # Return existing analysis (unreadable stored plans load as None and are regenerated)
+            repair_plan = issue.repair_plan
+            
+            # Generate flowcharts from existing data
+            mermaid_chart = generate_mermaid_flowchart(repair_plan)
+            text_chart = create_simple_flowchart(repair_plan.get("steps", []), repair_plan.get("is_diy", True))
+            
+            return {
+                "repair_plan": repair_plan,
+                "mermaid_flowchart": mermaid_chart,
+                "text_flowchart": text_chart,
+                "from_cache": True
+            }
         
-        # Update issue with analysis
-        issue.diagnosis = repair_plan.get("diagnosis", "")
-        issue.repair_plan = json.dumps(repair_plan)
-        issue.is_diy = repair_plan.get("is_diy", True)
-        issue.status = "analyzed"
+        if not wait:
+            # Poll GET /api/issues/{id}/plan: 202 while queued, the plan once saved
+            if issue_id not in pending_analyses:
+                try:
+                    analysis_queue.put_nowait((issue_id, force_reanalyze))
+                except asyncio.QueueFull:
+                    raise HTTPException(status_code=503, detail="Analysis queue is full, try again later")
+                pending_analyses.add(issue_id)
+                failed_analyses.pop(issue_id, None)
+            return ORJSONResponse(status_code=202, content={"status": "queued", "issue_id": issue_id})
         
-        db.commit()
+        repair_plan = await run_analysis(db, issue, force_reanalyze)
         
         # Generate flowchart
         mermaid_chart = generate_mermaid_flowchart(repair_plan)
@@ -167,21 +458,22 @@ async def analyze_issue(issue_id: int, force_reanalyze: bool = False, db: Sessio
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.put("/api/issues/{issue_id}", response_model=IssueResponse)
-async def update_issue(issue_id: int, issue_update: IssueUpdate, db: Session = Depends(get_db)):
+def update_issue(issue_id: int, issue_update: IssueUpdate, db: Session = Depends(get_db)):
     """Update issue status"""
-    issue = db.query(Issue).filter(Issue.id == issue_id).first()
+    issue = load_issue_with_analysis(db, issue_id)
     if not issue:
         raise HTTPException(status_code=404, detail="Issue not found")
     
-    for field, value in issue_update.dict(exclude_unset=True).items():
+    for field, value in issue_update.model_dump(exclude_unset=True).items():
         setattr(issue, field, value)
     
     db.commit()
-    db.refresh(issue)
+    # One SELECT for all columns; a plain refresh leaves the deferred analysis group to lazy-load
+    db.refresh(issue, attribute_names=[column.key for column in Issue.__table__.columns])
     return issue
 
 @app.delete("/api/issues/{issue_id}")
-async def delete_issue(issue_id: int, db: Session = Depends(get_db)):
+def delete_issue(issue_id: int, db: Session = Depends(get_db)):
     """Delete an issue and its related audit logs"""
     issue = db.query(Issue).filter(Issue.id == issue_id).first()
     if not issue:
@@ -198,26 +490,34 @@ async def delete_issue(issue_id: int, db: Session = Depends(get_db)):
 
 # Maintenance Provider endpoints
 @app.get("/api/providers/", response_model=List[MaintenanceProviderResponse])
-async def get_providers(specialty: Optional[str] = None, db: Session = Depends(get_db)):
+def get_providers(specialty: Optional[str] = None, db: Session = Depends(get_db)):
     """Get maintenance providers, optionally filtered by specialty"""
-    query = db.query(MaintenanceProvider)
+    def load_providers():
+        query = db.query(MaintenanceProvider)
+        if specialty:
+            query = query.filter(MaintenanceProvider.specialty == specialty)
+        # Cache validated models rather than ORM instances bound to this request's session
+        return [MaintenanceProviderResponse.model_validate(provider) for provider in query.all()]
+    
+    # Only the unfiltered list is cached: keying on the client-supplied specialty would let
+    # arbitrary values grow the cache, and the filtered query is an indexed lookup anyway
     if specialty:
-        query = query.filter(MaintenanceProvider.specialty == specialty)
-    return query.all()
+        return load_providers()
+    return get_cached_response("providers", PROVIDERS_CACHE_TTL, load_providers)
 
 @app.post("/api/providers/", response_model=MaintenanceProviderResponse)
-async def create_provider(provider: MaintenanceProviderCreate, db: Session = Depends(get_db)):
+def create_provider(provider: MaintenanceProviderCreate, db: Session = Depends(get_db)):
     """Create new maintenance provider"""
-    db_provider = MaintenanceProvider(**provider.dict())
+    db_provider = MaintenanceProvider(**provider.model_dump())
     db.add(db_provider)
     db.commit()
     db.refresh(db_provider)
     return db_provider
 
 @app.post("/api/issues/{issue_id}/call-maintenance")
-async def call_maintenance(issue_id: int, provider_id: int, db: Session = Depends(get_db)):
+def call_maintenance(issue_id: int, provider_id: int, db: Session = Depends(get_db)):
     """Call maintenance provider for an issue"""
-    issue = db.query(Issue).filter(Issue.id == issue_id).first()
+    issue = db.query(Issue).options(undefer_group("analysis")).filter(Issue.id == issue_id).first()
     provider = db.query(MaintenanceProvider).filter(MaintenanceProvider.id == provider_id).first()
     
     if not issue or not provider:
@@ -240,7 +540,7 @@ async def call_maintenance(issue_id: int, provider_id: int, db: Session = Depend
     db.commit()
     
     # Generate summary for provider
-    repair_plan = json.loads(issue.repair_plan) if issue.repair_plan else {}
+    repair_plan = issue.repair_plan or {}
     summary = {
         "issue_id": issue.id,
         "description": issue.description,
@@ -256,49 +556,75 @@ async def call_maintenance(issue_id: int, provider_id: int, db: Session = Depend
     return {"message": f"Maintenance request sent to {provider.name}", "summary": summary}
 
 # Audit Log endpoints
-@app.get("/api/audit-logs/", response_model=List[AuditLogResponse])
-async def get_audit_logs(issue_id: Optional[int] = None, db: Session = Depends(get_db)):
-    """Get audit logs, optionally filtered by issue"""
+@app.get("/api/audit-logs/", response_model=AuditLogPage)
+def get_audit_logs(
+    issue_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get audit logs newest first, optionally filtered by issue"""
     query = db.query(AuditLog)
     if issue_id:
         query = query.filter(AuditLog.issue_id == issue_id)
-    return query.order_by(AuditLog.created_at.desc()).all()
+    if cursor is not None:
+        # Resume after the cursor's (created_at, id) sort key. The key travels in the cursor
+        # itself, so paging still works if that row is deleted (delete_issue removes logs)
+        try:
+            cursor_created_at, cursor_id = cursor.rsplit("_", 1)
+            cursor_created_at, cursor_id = datetime.fromisoformat(cursor_created_at), int(cursor_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(or_(
+            AuditLog.created_at < cursor_created_at,
+            and_(AuditLog.created_at == cursor_created_at, AuditLog.id < cursor_id)
+        ))
+    return paginate(
+        query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()),
+        limit,
+        cursor_of=lambda log: f"{log.created_at.isoformat()}_{log.id}"
+    )
 
 @app.post("/api/audit-logs/", response_model=AuditLogResponse)
-async def create_audit_log(audit_log: AuditLogCreate, db: Session = Depends(get_db)):
+def create_audit_log(audit_log: AuditLogCreate, db: Session = Depends(get_db)):
     """Create audit log entry"""
-    db_log = AuditLog(**audit_log.dict())
+    db_log = AuditLog(**audit_log.model_dump())
     db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    # Flush assigns the id and defaults, so the response can be built without a re-SELECT
+    db.flush()
+    response = AuditLogResponse.model_validate(db_log)
     
-    # Update associated issue status
-    issue = db.query(Issue).filter(Issue.id == audit_log.issue_id).first()
-    if issue:
-        issue.status = audit_log.status
-        db.commit()
+    # Update associated issue status in the same transaction (no-op if the issue is gone)
+    db.query(Issue).filter(Issue.id == audit_log.issue_id).update(
+        {Issue.status: audit_log.status}, synchronize_session=False
+    )
+    db.commit()
     
-    return db_log
+    return response
 
-# Chat endpoint
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage, db: Session = Depends(get_db)):
-    """Chat with AI about repair issues"""
-    import asyncio
-    
+# Chat endpoints
+def get_chat_context(issue_id: Optional[int], db: Session) -> str:
+    """Build the repair context for a chat message from its issue, if any"""
     context = ""
     
     # Get context from issue if provided
-    if message.issue_id:
-        issue = db.query(Issue).filter(Issue.id == message.issue_id).first()
+    if issue_id:
+        issue = db.query(Issue).options(undefer_group("analysis")).filter(Issue.id == issue_id).first()
         if issue:
-            repair_plan = json.loads(issue.repair_plan) if issue.repair_plan else {}
-            context = f"Issue: {issue.description}\nDiagnosis: {issue.diagnosis}\nRepair Plan: {json.dumps(repair_plan, indent=2)}"
+            repair_plan = issue.repair_plan or {}
+            context = f"Issue: {issue.description}\nDiagnosis: {issue.diagnosis}\nRepair Plan: {orjson.dumps(repair_plan, option=orjson.OPT_INDENT_2).decode()}"
+    
+    return context
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(message: ChatMessage, db: Session = Depends(get_db)):
+    """Chat with AI about repair issues"""
+    context = await run_in_threadpool(get_chat_context, message.issue_id, db)
     
     try:
         # Add timeout wrapper to prevent hanging
         response = await asyncio.wait_for(
-            asyncio.to_thread(phi4_service.chat_response, message.message, context),
+            get_phi4_service().achat_response(message.message, context, message.session_id),
             timeout=60.0  # 60 second timeout for AI processing
         )
         return ChatResponse(response=response, context=context if context else None)
@@ -314,61 +640,75 @@ async def chat(message: ChatMessage, db: Session = Depends(get_db)):
             context=context if context else None
         )
 
+@app.post("/api/chat/stream")
+async def chat_stream(message: ChatMessage, db: Session = Depends(get_db)):
+    """Chat with AI about repair issues, streaming tokens as Server-Sent Events"""
+    context = await run_in_threadpool(get_chat_context, message.issue_id, db)
+    
+    async def event_stream():
+        try:
+            async for token in get_phi4_service().achat_stream(message.message, context, message.session_id):
+                # JSON-encode each token so newlines can't break SSE framing
+                yield f"data: {orjson.dumps(token).decode()}\n\n"
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield f"event: error\ndata: {orjson.dumps('Sorry, I encountered an error. Please try again.').decode()}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 # Dashboard endpoint
 @app.get("/api/dashboard")
-async def get_dashboard(db: Session = Depends(get_db)):
+def get_dashboard(db: Session = Depends(get_db)):
     """Get dashboard statistics"""
-    total_issues = db.query(Issue).count()
-    completed_issues = db.query(Issue).filter(Issue.status == "completed").count()
-    
-    # Track actual completion method based on what users actually did
-    # Check audit logs for maintenance requests vs DIY completions
-    maintenance_requests = db.query(AuditLog).filter(
-        AuditLog.status.in_(["maintenance_requested", "completed"]),
-        AuditLog.completed_by != "DIY"
-    ).distinct(AuditLog.issue_id).count()
-    
-    # DIY issues are those without maintenance requests OR explicitly marked as DIY in audit logs
-    diy_completed = db.query(AuditLog).filter(
-        AuditLog.status == "completed",
-        AuditLog.completed_by == "DIY"
-    ).distinct(AuditLog.issue_id).count()
-    
-    # For issues without audit logs, fall back to the original is_diy flag
-    issues_with_audit_logs = db.query(AuditLog.issue_id).distinct().subquery()
-    issues_without_audit = db.query(Issue).filter(
-        ~Issue.id.in_(issues_with_audit_logs)
-    ).all()
-    
-    # Add fallback counts for issues without audit logs
-    fallback_diy = sum(1 for issue in issues_without_audit if issue.is_diy)
-    fallback_professional = sum(1 for issue in issues_without_audit if not issue.is_diy)
+    return get_cached_response("dashboard", DASHBOARD_CACHE_TTL, lambda: compute_dashboard(db))
+
+def compute_dashboard(db: Session) -> dict:
+    """Compute dashboard statistics from the database"""
+    # Issues without audit logs fall back to their original is_diy flag
+    has_audit_log = exists().where(AuditLog.issue_id == Issue.id)
+    
+    # One pass over issues for every issue-level count
+    (
+        total_issues,
+        completed_issues,
+        completed_diy_issues,
+        issues_without_audit,
+        fallback_diy
+    ) = db.query(
+        func.count(Issue.id),
+        func.coalesce(func.sum(case((Issue.status == "completed", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((and_(Issue.status == "completed", Issue.is_diy == True), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((~has_audit_log, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((and_(~has_audit_log, Issue.is_diy == True), 1), else_=0)), 0)
+    ).one()
+    
+    # One pass over audit logs for what users actually did, plus the recorded costs
+    (
+        maintenance_requests,
+        diy_completed,
+        total_cost
+    ) = db.query(
+        func.coalesce(func.sum(case((and_(
+            AuditLog.status.in_(["maintenance_requested", "completed"]),
+            AuditLog.completed_by != "DIY"
+        ), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((and_(
+            AuditLog.status == "completed",
+            AuditLog.completed_by == "DIY"
+        ), 1), else_=0)), 0),
+        func.coalesce(func.sum(AuditLog.cost), 0.0)
+    ).one()
     
     # Final counts: actual usage from audit logs + fallback from original flags
+    fallback_professional = issues_without_audit - fallback_diy
     actual_diy_issues = diy_completed + fallback_diy
     actual_professional_issues = maintenance_requests + fallback_professional
     
-    # Calculate costs from audit logs
-    try:
-        audit_costs = db.query(AuditLog.cost).filter(AuditLog.cost.isnot(None)).all()
-        total_cost = sum([cost[0] for cost in audit_costs]) if audit_costs else 0.0
-        
-        # If no audit logs exist, provide estimated costs based on issue types
-        if total_cost == 0.0 and completed_issues > 0:
-            # Estimate costs for completed issues (fallback calculation)
-            completed_issue_list = db.query(Issue).filter(Issue.status == "completed").all()
-            estimated_cost = 0.0
-            for issue in completed_issue_list:
-                # Simple estimation based on issue type
-                if issue.is_diy:
-                    estimated_cost += 25.0  # Average DIY material cost
-                else:
-                    estimated_cost += 150.0  # Average professional service cost
-            total_cost = estimated_cost
-            
-    except Exception as e:
-        print(f"Error calculating costs: {e}")
-        total_cost = 0.0
+    # If no costs were logged, estimate them for completed issues:
+    # average DIY material cost vs average professional service cost
+    if total_cost == 0.0 and completed_issues > 0:
+        total_cost = completed_diy_issues * 25.0 + (completed_issues - completed_diy_issues) * 150.0
     
     return {
         "total_issues": total_issues,
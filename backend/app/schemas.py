@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -10,7 +10,7 @@ class IssueCreate(BaseModel):
 class IssueUpdate(BaseModel):
     status: Optional[str] = None
     diagnosis: Optional[str] = None
-    repair_plan: Optional[str] = None
+    repair_plan: Optional[dict] = None
     is_diy: Optional[bool] = None
 
 class MaintenanceProviderCreate(BaseModel):
@@ -31,24 +31,41 @@ class AuditLogCreate(BaseModel):
 class ChatMessage(BaseModel):
     message: str
     issue_id: Optional[int] = None
+    session_id: Optional[str] = None  # Reuses the model's context across turns of one conversation
 
 # Response Models
 class IssueResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     image_path: str
     description: str
     voice_note_path: Optional[str]
     diagnosis: Optional[str]
-    repair_plan: Optional[str]
+    repair_plan: Optional[dict]
     is_diy: bool
     status: str
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+# Narrow row for issue lists; omits the analysis text and file paths
+class IssueListItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    description: str
+    status: str
+    is_diy: bool
+    created_at: datetime
+
+# Keyset-paginated page of issues; pass next_cursor back as ?cursor= for the next page
+class IssuePage(BaseModel):
+    items: List[IssueListItem]
+    next_cursor: Optional[int] = None
 
 class MaintenanceProviderResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str
     specialty: str
@@ -59,10 +76,9 @@ class MaintenanceProviderResponse(BaseModel):
     rating: float
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 class AuditLogResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     issue_id: int
     cost: Optional[float]
@@ -72,17 +88,39 @@ class AuditLogResponse(BaseModel):
     completed_by: Optional[str]
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+# Keyset-paginated page of audit logs; pass next_cursor back as ?cursor= for the next page
+class AuditLogPage(BaseModel):
+    items: List[AuditLogResponse]
+    # Opaque "<created_at>_<id>" sort key of the page's last log
+    next_cursor: Optional[str] = None
+
+# Validates model output: format="json" only guarantees valid JSON, so free-text fields
+# accept numbers (e.g. "estimated_cost": 50) and list fields accept a bare string
+def _wrap_bare_string(value):
+    return [value] if isinstance(value, str) else value
+
+class RepairStep(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    
+    step: Optional[int] = None
+    instruction: Optional[str] = None
+    tools_needed: Optional[List[str]] = []
+    estimated_time: Optional[str] = None
+    
+    _wrap_tools_needed = field_validator("tools_needed", mode="before")(_wrap_bare_string)
 
 class RepairPlan(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    
     diagnosis: str
-    steps: List[dict]
+    steps: List[RepairStep]
     is_diy: bool
     estimated_time: Optional[str] = None
     estimated_cost: Optional[str] = None
     safety_warnings: Optional[List[str]] = None
     recommended_provider: Optional[str] = None
+    
+    _wrap_safety_warnings = field_validator("safety_warnings", mode="before")(_wrap_bare_string)
 
 class ChatResponse(BaseModel):
     response: str
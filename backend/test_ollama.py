@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 
-import ollama
 import json
 
+from app.ai_service import get_phi4_service
+
 def test_ollama():
     try:
         print("Testing Ollama connection...")
-        client = ollama.Client()
+        # Same pooled client (and OLLAMA_HOST / OLLAMA_TIMEOUT settings) the backend uses
+        client = get_phi4_service().client
         
         # Test with the problematic prompt
         prompt = """
@@ -22,6 +22,8 @@ const ChatInterface = ({ issueId, issueContext }) => {
   const [messages, setMessages] = useState([]);
   const [currentMessage, setCurrentMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  // Lets the backend reuse the model's context across turns of this conversation
+  const [sessionId] = useState(() => `chat-${Date.now()}-${Math.random().toString(36).slice(2)}`);
 
   useEffect(() => {
     // Initialize with welcome message
@@ -61,7 +63,7 @@ const ChatInterface = ({ issueId, issueContext }) => {
     setIsLoading(true);
 
     try {
-      const response = await chatAPI.sendMessage(currentMessage, issueId);
+      const response = await chatAPI.sendMessage(currentMessage, issueId, sessionId);
       
       const botMessage = {
         id: Date.now() + 1,
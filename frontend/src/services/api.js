@@ -47,10 +47,10 @@ export const issuesAPI = {
     return response.data;
   },
 
-  // Get all issues
+  // Get the most recent issues (first page, newest first)
   getIssues: async () => {
     const response = await api.get('/api/issues/');
-    return response.data;
+    return response.data.items;
   },
 
   // Get specific issue
@@ -114,7 +114,7 @@ export const auditAPI = {
   getAuditLogs: async (issueId = null) => {
     const params = issueId ? { issue_id: issueId } : {};
     const response = await api.get('/api/audit-logs/', { params });
-    return response.data;
+    return response.data.items;
   },
 
   // Create audit log
@@ -127,10 +127,11 @@ export const auditAPI = {
 // Chat API
 export const chatAPI = {
   // Send chat message
-  sendMessage: async (message, issueId = null) => {
+  sendMessage: async (message, issueId = null, sessionId = null) => {
     const response = await api.post('/api/chat', {
       message,
       issue_id: issueId,
+      session_id: sessionId,
     });
     return response.data;
   },